@@ -1,19 +1,87 @@
 """
 This AWS Lambda function composes the final dubbed video using ffmpeg.
-Downloads the original input video and the merged Japanese MP3 audio from S3.
+Streams the original input video and the merged Japanese MP3 audio from S3 into ffmpeg.
 Merges the video and audio tracks using FFmpeg while preserving video duration and quality.
-Uploads the final composed video to S3 under the 'Final/' prefix for downstream use.
+Streams the final composed video to S3 under the 'Final/' prefix for downstream use.
 """
 import os
 import subprocess
 import json
-import boto3
+import threading
 
 # Import necessary utility functions from common_utils.py
-from common_utils import get_bucket_names, download_file_from_s3, upload_file_to_s3
+from common_utils import get_bucket_names, get_s3_client, upload_stream_to_s3, WarmupAttemptComplete, stop_after_first_attempt
+
+# Create the shared S3 client and connect to the S3 endpoint during init, so the first invocation
+# skips client creation, DNS and the TLS handshake. The streaming upload reuses the same connection pool.
+# Skipped under provisioned concurrency, where init can run long before the first request
+# and the idle connection would be closed by then. head_bucket is limited to a single attempt
+# so a stalled endpoint cannot push the init phase past its time limit.
+if os.environ.get('AWS_LAMBDA_INITIALIZATION_TYPE') == 'on-demand':
+    s3 = get_s3_client()
+    s3.meta.events.register_first('needs-retry.s3.HeadBucket', stop_after_first_attempt)
+    try:
+        s3.head_bucket(Bucket=get_bucket_names()['output_bucket'])
+    except WarmupAttemptComplete:
+        pass
+    except Exception as e:
+        print(f"S3 connection warm-up failed: {e}")
+    finally:
+        s3.meta.events.unregister('needs-retry.s3.HeadBucket', stop_after_first_attempt)
+
+# Lifetime of the presigned URL ffmpeg uses to read the input video
+PRESIGNED_URL_EXPIRES_IN = 3600
+# Only the end of ffmpeg's stderr is kept for diagnostics
+FFMPEG_STDERR_TAIL_BYTES = 64 * 1024
+# ffprobe reads the audio over HTTPS; give up on a stalled connection and re-encode instead
+FFPROBE_TIMEOUT_SECONDS = 30
+
+def stream_to_stdin(body, stdin, errors):
+    # Copy an S3 streaming body into ffmpeg's stdin, then close it so ffmpeg sees EOF.
+    # A failed S3 read would otherwise look like a normal EOF to ffmpeg,
+    # so the exception is appended to errors for the caller to re-raise.
+    try:
+        for chunk in body.iter_chunks(chunk_size=1024 * 1024):
+            stdin.write(chunk)
+    except BrokenPipeError:
+        print("FFmpeg closed its input early; see FFmpeg stderr for details.")
+    except Exception as e:
+        errors.append(e)
+    finally:
+        body.close()
+        try:
+            stdin.close()
+        except BrokenPipeError:
+            pass
+
+def read_tail(stream, tail):
+    # Drain a stream to EOF, keeping only its last FFMPEG_STDERR_TAIL_BYTES in the tail bytearray
+    while True:
+        chunk = stream.read1(64 * 1024)
+        if not chunk:
+            break
+        tail += chunk
+        del tail[:-FFMPEG_STDERR_TAIL_BYTES]
+
+def audio_codec(source):
+    # Return the codec name of the first audio stream (e.g. 'aac', 'mp3'), or None if it cannot be probed
+    try:
+        return subprocess.check_output(
+            ['ffprobe', '-v', 'error', '-select_streams', 'a:0', '-show_entries', 'stream=codec_name', '-of', 'csv=p=0', source],
+            timeout=FFPROBE_TIMEOUT_SECONDS
+        ).decode().strip() or None
+    except subprocess.CalledProcessError as e:
+        print(f"ffprobe failed with exit status {e.returncode}; audio will be re-encoded.")
+        return None
+    except subprocess.TimeoutExpired:
+        print(f"ffprobe timed out after {FFPROBE_TIMEOUT_SECONDS} seconds; audio will be re-encoded.")
+        return None
+    except FileNotFoundError:
+        print("ffprobe not found; audio will be re-encoded.")
+        return None
 
 def lambda_handler(event, context):
-    s3 = boto3.client('s3')
+    s3 = get_s3_client()
 
     buckets = get_bucket_names()
     output_bucket = buckets['output_bucket']
@@ -28,65 +96,112 @@ def lambda_handler(event, context):
     if not merged_japanese_audio_key: # Error if the single merged audio file key is missing
         raise ValueError("Merged Japanese audio key is missing in the event payload.")
 
-    # Define local paths for input video, merged audio, and final output video
+    # Define the S3 key for the final output video
     base_name = os.path.splitext(os.path.basename(input_video_key))[0]
-    local_input_video_path = f'/tmp/{os.path.basename(input_video_key)}'
-    local_merged_japanese_audio_path = f'/tmp/{os.path.basename(merged_japanese_audio_key)}' # Path for the single audio file
     final_output_video_key = f"FinalVideos/{base_name}_ja.mp4"
-    local_output_video_path = f'/tmp/{os.path.basename(final_output_video_key)}'
 
-    # Download input video and merged Japanese audio from S3
-    print(f"Downloading input video from {input_bucket}/{input_video_key}...")
-    download_file_from_s3(input_bucket, input_video_key, local_input_video_path)
-    print(f"Downloading merged Japanese audio from {output_bucket}/{merged_japanese_audio_key}...")
-    download_file_from_s3(output_bucket, merged_japanese_audio_key, local_merged_japanese_audio_path)
+    # Stream inputs instead of staging them in /tmp:
+    # ffmpeg reads the video over HTTP(S) with range requests via a presigned URL,
+    # and the merged Japanese audio is piped from the S3 response body into ffmpeg's stdin.
+    print(f"Streaming input video from {input_bucket}/{input_video_key}...")
+    input_video_url = s3.generate_presigned_url(
+        'get_object',
+        Params={'Bucket': input_bucket, 'Key': input_video_key},
+        ExpiresIn=PRESIGNED_URL_EXPIRES_IN
+    )
+
+    # AAC audio can be copied into the MP4 as-is; anything else is re-encoded to AAC.
+    # ffprobe only reads the head of the file through a presigned URL.
+    merged_japanese_audio_url = s3.generate_presigned_url(
+        'get_object',
+        Params={'Bucket': output_bucket, 'Key': merged_japanese_audio_key},
+        ExpiresIn=PRESIGNED_URL_EXPIRES_IN
+    )
+    merged_japanese_audio_codec = audio_codec(merged_japanese_audio_url)
+    print(f"Merged Japanese audio codec: {merged_japanese_audio_codec}")
+    if merged_japanese_audio_codec == 'aac':
+        audio_codec_args = ['-c:a', 'copy']                    # Copy AAC audio without re-encoding
+    else:
+        audio_codec_args = ['-c:a', 'aac', '-b:a', '192k']     # Re-encode audio to AAC format at 192 kbps
 
     # Build the FFmpeg command
     # This command copies the video stream from the original video
     # and replaces its audio stream with the audio stream from the new merged Japanese audio file.
     ffmpeg_command = [
         'ffmpeg',
-        '-i', local_input_video_path,         # First input: original video
-        '-i', local_merged_japanese_audio_path, # Second input: merged Japanese audio
+        '-hide_banner',                       # Skip the build/configuration banner
+        '-loglevel', 'error',                 # Only log errors, so stderr stays small
+        '-nostats',                           # Disable the per-frame progress line
+        '-fflags', '+genpts',                 # Regenerate missing presentation timestamps (applies to the next input only)
+        '-i', input_video_url,                # First input: original video (presigned S3 URL)
+        '-fflags', '+genpts',                 # Same for the piped audio, the input most likely to lack timestamps
+        '-i', 'pipe:0',                       # Second input: merged Japanese audio (streamed via stdin)
         '-map', '0:v:0',                      # Map video stream from the first input (video)
         '-map', '1:a:0',                      # Map audio stream from the second input (audio)
         '-c:v', 'copy',                       # Copy video stream without re-encoding (faster, no quality loss)
-        '-c:a', 'aac',                        # Re-encode audio to AAC format
-        '-b:a', '192k',                       # Set audio bitrate
+        *audio_codec_args,                    # Copy AAC audio, otherwise re-encode it to AAC
+        '-threads', '0',                      # Let ffmpeg use every vCPU available to the Lambda
+        '-avoid_negative_ts', 'make_zero',    # Shift timestamps so the output starts at zero
         # '-shortest',                          # Terminate encoding when the shortest input stream ends.
                                               # Since GenerateJapaneseAudioLambda already padded the audio to video length,
                                               # this option only affects if the video is shorter than the audio.
                                               # It acts as a safety measure for cases where audio might somehow be longer than video.
-        '-y',                                 # Overwrite output file without asking if it already exists.
-        local_output_video_path               # Path for the final output video file
+        '-f', 'mp4',                          # Output container must be explicit when writing to a pipe
+        '-movflags', 'frag_keyframe+empty_moov', # Fragmented MP4 can be written without seeking back.
+                                              # The moov atom is written up front, so players can start
+                                              # before the whole file is downloaded (what +faststart does for seekable outputs).
+        'pipe:1'                              # Write the final video to stdout for streaming upload
     ]
 
-    print(f"Running FFmpeg command: {' '.join(ffmpeg_command)}")
+    # Log the command without the presigned URL, which grants read access to the input video
+    print(f"Running FFmpeg command: {' '.join(ffmpeg_command).replace(input_video_url, '<presigned input video URL>')}")
 
+    # Open the audio stream only now, after the probe, so the S3 response does not sit idle
+    print(f"Streaming merged Japanese audio from {output_bucket}/{merged_japanese_audio_key}...")
+    audio_body = s3.get_object(Bucket=output_bucket, Key=merged_japanese_audio_key)['Body']
+    feeder_started = False
+
+    print(f"Uploading final video to S3: {output_bucket}/{final_output_video_key}")
     try:
-        process = subprocess.run(ffmpeg_command, check=True, capture_output=True, text=True)
+        process = subprocess.Popen(ffmpeg_command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        # Feed the audio and drain ffmpeg's error log on separate threads,
+        # while the main thread uploads the muxed video from ffmpeg's stdout
+        feeder_errors = []
+        feeder = threading.Thread(target=stream_to_stdin, args=(audio_body, process.stdin, feeder_errors))
+        feeder.start()
+        feeder_started = True
+        stderr_tail = bytearray()
+        stderr_reader = threading.Thread(target=read_tail, args=(process.stderr, stderr_tail))
+        stderr_reader.start()
+
+        def wait_for_ffmpeg():
+            # Only complete the upload if ffmpeg produced the whole file from the whole audio stream
+            feeder.join()
+            stderr_reader.join()
+            if feeder_errors:
+                raise feeder_errors[0]
+            if process.wait() != 0:
+                raise subprocess.CalledProcessError(process.returncode, ffmpeg_command[0], stderr=bytes(stderr_tail))
+
+        try:
+            upload_stream_to_s3(output_bucket, final_output_video_key, process.stdout, content_type='video/mp4', before_complete=wait_for_ffmpeg)
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
         print("FFmpeg command executed successfully.")
-        print("FFmpeg stdout:", process.stdout)
-        print("FFmpeg stderr:", process.stderr)
+        if stderr_tail:
+            print("FFmpeg stderr:", stderr_tail.decode('utf-8', errors='replace'))
     except subprocess.CalledProcessError as e:
-        print(f"FFmpeg error: {e.stderr}")
+        print(f"FFmpeg error: {e.stderr.decode('utf-8', errors='replace')}")
         raise
     except FileNotFoundError:
         print("FFmpeg not found. Ensure it is installed and in the PATH.")
         raise
-
-    # Upload the final video to S3
-    print(f"Uploading final video to S3: {output_bucket}/{final_output_video_key}")
-    upload_file_to_s3(output_bucket, final_output_video_key, local_output_video_path, content_type='video/mp4')
-
-    # Clean up temporary files
-    print("Cleaning up temporary files...")
-    if os.path.exists(local_input_video_path):
-        os.remove(local_input_video_path)
-    if os.path.exists(local_merged_japanese_audio_path):
-        os.remove(local_merged_japanese_audio_path)
-    if os.path.exists(local_output_video_path):
-        os.remove(local_output_video_path)
+    finally:
+        # Once started, the feeder thread closes the audio body; otherwise release its connection here
+        if not feeder_started:
+            audio_body.close()
 
     return {
         'input_video_key': input_video_key,
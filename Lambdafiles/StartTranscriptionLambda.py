@@ -10,37 +10,43 @@ This AWS Lambda function initiates a transcription job for a given input video f
 import boto3
 import time
 import os
+from botocore.config import Config
 from common_utils import get_bucket_names
 
+# Created once per container and reused across warm invocations.
+# The start_transcription_job request always has the same shape, so botocore's
+# per-call parameter validation against the service model is skipped.
+transcribe = boto3.client(
+    'transcribe',
+    config=Config(parameter_validation=False, retries={'mode': 'adaptive'}, tcp_keepalive=True)
+)
+
 def filter_low_confidence_items_and_segments(data, threshold=0.25):
     items = data["results"]["items"]
     segments = data["results"]["audio_segments"]
 
+    items_by_id = {}
     low_confidence_ids = set()
     for item in items:
+        items_by_id[item["id"]] = item
         if item["type"] == "pronunciation":
             confidence = float(item["alternatives"][0].get("confidence", "1.0"))
             if confidence < threshold:
                 low_confidence_ids.add(item["id"])
 
+    get_item = items_by_id.get
     for seg in segments:
-        new_items = []
-        new_transcript_words = []
-        for item_id in seg["items"]:
-            if item_id not in low_confidence_ids:
-                new_items.append(item_id)
-                matched_item = next((i for i in items if i["id"] == item_id), None)
-                if matched_item:
-                    new_transcript_words.append(matched_item["alternatives"][0]["content"])
+        new_items = [item_id for item_id in seg["items"] if item_id not in low_confidence_ids]
         seg["items"] = new_items
-        seg["transcript"] = " ".join(new_transcript_words)
+        seg["transcript"] = " ".join(
+            matched_item["alternatives"][0]["content"]
+            for matched_item in map(get_item, new_items)
+            if matched_item
+        )
 
     return data
 
 def lambda_handler(event, context):
-    s3 = boto3.client('s3')
-    transcribe = boto3.client('transcribe')
-
     buckets = get_bucket_names()    # Get bucket names from common_utils        
     input_bucket = buckets['input_bucket']
     output_bucket = buckets['output_bucket']
@@ -3,7 +3,7 @@ This AWS Lambda function translates English transcription results into Japanese
 
 - Retrieves S3 bucket names using a utility function from common_utils.
 - Receives the S3 key of the transcription result and the input video key via the event payload.
-- Downloads the transcription result JSON from S3.
+- Reads the transcription result JSON from S3.
 - Translates each English subtitle segment to Japanese using Amazon Translate.
 - Saves the translated subtitles as a JSON file in the output S3 bucket under the 'TranslateSubtitles/' prefix.
 - Returns the input video key and the S3 key for the translated subtitles.
@@ -11,38 +11,84 @@ This AWS Lambda function translates English transcription results into Japanese
 import json
 import boto3
 import os
-from common_utils import get_bucket_names, download_file_from_s3, upload_file_to_s3
+import re
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from botocore.config import Config
+from common_utils import get_bucket_names, get_s3_client, download_json_from_s3, upload_json_to_s3, WarmupAttemptComplete, stop_after_first_attempt
+
+# Maximum number of concurrent Bedrock invocations. Tune to the account's Bedrock TPS quota.
+MAX_TRANSLATION_WORKERS = int(os.environ.get('MAX_TRANSLATION_WORKERS', '8'))
+# Number of segments translated together in a single Bedrock prompt.
+TRANSLATION_BATCH_SIZE = int(os.environ.get('TRANSLATION_BATCH_SIZE', '10'))
+
+# Created once per container and reused across warm invocations.
+# A single client is shared by all worker threads, with one pooled connection per worker;
+# adaptive retries back off on ThrottlingException.
+# A short connect timeout keeps a stalled connection attempt from eating the Lambda timeout; retries cover it.
+bedrock_runtime = boto3.client(
+    'bedrock-runtime',
+    config=Config(
+        retries={'mode': 'adaptive', 'max_attempts': 10},
+        connect_timeout=5,
+        max_pool_connections=MAX_TRANSLATION_WORKERS,
+        tcp_keepalive=True
+    )
+)
+
+# Build the shared S3 client used by the JSON helpers during init too, rather than inside the first invocation
+get_s3_client()
+
+# Open the Bedrock Runtime connection during init so the first invocation skips the TLS handshake.
+# Skipped under provisioned concurrency, where init can run long before the first request
+# and the idle connection would be closed by then. The warm-up makes exactly one attempt through
+# the shared client's connection pool, so it never retries inside the init phase.
+if os.environ.get('AWS_LAMBDA_INITIALIZATION_TYPE') == 'on-demand':
+    bedrock_runtime.meta.events.register_first('needs-retry.bedrock-runtime.ListAsyncInvokes', stop_after_first_attempt)
+    try:
+        bedrock_runtime.list_async_invokes(maxResults=1)
+    except WarmupAttemptComplete:
+        pass
+    except Exception as e:
+        print(f"[WARN] Bedrock connection warm-up failed: {e}")
+    finally:
+        bedrock_runtime.meta.events.unregister('needs-retry.bedrock-runtime.ListAsyncInvokes', stop_after_first_attempt)
+
+# Segments made up only of filler words translate to an empty subtitle, so they skip Bedrock entirely
+FILLER_RE = re.compile(
+    r'^[\s,.!?]*(?:um|uh|so|well|you know|i mean)(?:[\s,.!?]+(?:um|uh|so|well|you know|i mean))*[\s,.!?]*$',
+    re.IGNORECASE
+)
 
 def filter_low_confidence_items_and_segments(data, threshold=0.25):
     items = data["results"]["items"]
     segments = data["results"]["audio_segments"]
 
     # Step 1: 低confidenceの item id を集める
+    items_by_id = {}
     low_confidence_ids = set()
     for item in items:
+        items_by_id[item["id"]] = item
         if item["type"] == "pronunciation":
             confidence = float(item["alternatives"][0].get("confidence", "1.0"))
             if confidence < threshold:
                 low_confidence_ids.add(item["id"])
 
     # Step 2: audio_segments を処理して、transcriptとitemsを再構成
+    get_item = items_by_id.get
     cleaned_segments = []
     for seg in segments:
-        new_items = []
-        new_transcript_words = []
+        kept = [
+            (item_id, matched_item)
+            for item_id in seg["items"]
+            if item_id not in low_confidence_ids and (matched_item := get_item(item_id))
+        ]
 
-        for item_id in seg["items"]:
-            if item_id not in low_confidence_ids:
-                matched_item = next((i for i in items if i["id"] == item_id), None)
-                if matched_item:
-                    new_items.append(item_id)
-                    new_transcript_words.append(matched_item["alternatives"][0]["content"])
-
-        new_transcript = " ".join(new_transcript_words)
+        new_transcript = " ".join(matched_item["alternatives"][0]["content"] for _, matched_item in kept)
 
         # ✅ transcriptが空欄でない場合のみ追加
         if new_transcript.strip():
-            seg["items"] = new_items
+            seg["items"] = [item_id for item_id, _ in kept]
             seg["transcript"] = new_transcript
             cleaned_segments.append(seg)
 
@@ -51,26 +97,118 @@ def filter_low_confidence_items_and_segments(data, threshold=0.25):
     return data
 
 
+# Static parts of the prompts, built once per container instead of on every Bedrock call
+TRANSLATION_PROMPT_PREFIX = """
+        You are a professional translator converting English speech into Japanese subtitles for TTS (text-to-speech) narration.
+        Translate the English text into polite, clear, and natural Japanese using the "です・ます" form, suitable for subtitle narration. The style must be concise yet formal and sound natural to native Japanese speakers.
+
+        ⚠️ Your translation must fit within **""".lstrip()
+TRANSLATION_PROMPT_SUFFIX = """ Japanese characters**. This is a strict limit. Do not exceed it.
+        ⚠️ However, DO NOT cut off the translation unnaturally. If your generated sentence becomes too long, **rephrase it naturally to reduce length** while maintaining meaning and politeness. Ensure that the result is a grammatically complete and natural Japanese sentence.
+
+        Omit filler words like "um", "uh", "you know", and similar expressions. If the input consists only of such words, return an empty string without any explanation.
+        If the English text consists only of such filler words, return an empty string with absolutely no explanation, placeholder, or substitute text. Just return nothing.
+
+        
+        When translating:
+        - Use proper particles (助詞) to ensure grammatical clarity and natural flow. Do not omit necessary particles like 「が」「を」「に」「と」.
+        - You MAY lightly adjust the sentence structure to improve fluency, only if the meaning is preserved.
+        - You MAY add auxiliary words or omit minor details to keep the output natural and concise.
+        - If the English text contains the word "Cognizant", do not translate it. Keep "Cognizant" as-is, since it is a proper noun referring to a company name.
+
+        Return only the final translated Japanese text. Do not include line breaks, formatting, or any commentary.
+
+        English text:
+        """
+BATCH_TRANSLATION_PROMPT_PREFIX = """
+        You are a professional translator converting English speech into Japanese subtitles for TTS (text-to-speech) narration.
+        Translate each English segment into polite, clear, and natural Japanese using the "です・ます" form, suitable for subtitle narration. The style must be concise yet formal and sound natural to native Japanese speakers.
+
+        The segments are given as a JSON array of objects with an "id", a "max_chars" limit and the "english" text.
+        ⚠️ Each translation must fit within its own **"max_chars" Japanese characters**. This is a strict limit. Do not exceed it.
+        ⚠️ However, DO NOT cut off the translation unnaturally. If your generated sentence becomes too long, **rephrase it naturally to reduce length** while maintaining meaning and politeness. Ensure that the result is a grammatically complete and natural Japanese sentence.
+
+        Omit filler words like "um", "uh", "you know", and similar expressions. If a segment consists only of such words, its translation must be an empty string.
+        Translate every segment independently. Do not merge, split, or reorder segments.
+
+        When translating:
+        - Use proper particles (助詞) to ensure grammatical clarity and natural flow. Do not omit necessary particles like 「が」「を」「に」「と」.
+        - You MAY lightly adjust the sentence structure to improve fluency, only if the meaning is preserved.
+        - You MAY add auxiliary words or omit minor details to keep the output natural and concise.
+        - If the English text contains the word "Cognizant", do not translate it. Keep "Cognizant" as-is, since it is a proper noun referring to a company name.
+
+        Return only a strict JSON array with one object per segment in the form {"id": <id>, "ja": "<Japanese translation>"}. Do not include line breaks inside translations, formatting, or any commentary.
+
+        Segments:
+        """.lstrip()
+
+# Fields shared by every Bedrock request; only the messages and max_tokens change per call
+BEDROCK_REQUEST_TEMPLATE = {
+    "anthropic_version": "bedrock-2023-05-31",
+    "temperature": 0
+}
+
+
+def build_translation_prompt(english_text, max_translated_characters):
+    # Construct the prompt for Bedrock for natural translation
+    return TRANSLATION_PROMPT_PREFIX + str(max_translated_characters) + TRANSLATION_PROMPT_SUFFIX + english_text.strip()
+
+
+def build_batch_translation_prompt(entries):
+    # Construct a single prompt that translates several segments at once and answers in JSON
+    segments_json = json.dumps(
+        [{"id": entry['id'], "max_chars": entry['max_chars'], "english": entry['text']} for entry in entries],
+        ensure_ascii=False
+    )
+    return BATCH_TRANSLATION_PROMPT_PREFIX + segments_json
+
+
+def invoke_claude(bedrock_runtime, prompt, max_tokens):
+    # Invoke Bedrock Claude and return the text of the first content block
+    request = BEDROCK_REQUEST_TEMPLATE.copy()
+    request["messages"] = [{"role": "user", "content": prompt}]
+    request["max_tokens"] = max_tokens
+    body = json.dumps(request)
+    print("[DEBUG] Request body for invoke_model:")
+    print(body)
+
+    response = bedrock_runtime.invoke_model(
+        body=body,
+        modelId="anthropic.claude-3-sonnet-20240229-v1:0",
+        accept="application/json",
+        contentType="application/json"
+    )
+    print("[DEBUG] Raw response:")
+    print(response)
+
+    response_body = json.loads(response.get('body').read().decode('utf-8'))
+    print("[DEBUG] Parsed response body:")
+    print(json.dumps(response_body, indent=2))
+
+    if "error" in response_body:
+        raise RuntimeError(f"Claude returned error: {response_body['error'].get('message', 'No message')}")
+
+    # Claude 3 expected structure
+    content_blocks = response_body.get('content', [])
+    if not content_blocks or 'text' not in content_blocks[0]:
+        raise ValueError(f"Unexpected response structure: {json.dumps(response_body, indent=2)}")
+
+    return content_blocks[0]['text'].strip()
+
+
 def lambda_handler(event, context):
     print("[DEBUG] Lambda invoked")
     print("[DEBUG] event =")
     print(json.dumps(event, indent=2))
 
-    bedrock_runtime = boto3.client('bedrock-runtime')
-
     buckets = get_bucket_names() # Get bucket names from common_utils
     output_bucket = buckets['output_bucket']
 
     transcribe_result_key = event.get('transcribe_result_key')
     input_video_key = event.get('input_video_key')
 
-    local_transcript_file = '/tmp/transcript.json'
-    
-    # Download transcribe result from S3
-    download_file_from_s3(output_bucket, transcribe_result_key, local_transcript_file)
-    
-    with open(local_transcript_file, 'r', encoding='utf-8') as f:
-        transcript_data = json.load(f)
+    # Read transcribe result from S3
+    transcript_data = download_json_from_s3(output_bucket, transcribe_result_key)
 
     transcript_data = filter_low_confidence_items_and_segments(transcript_data, threshold=0.25)
     
@@ -85,9 +223,8 @@ def lambda_handler(event, context):
     else:
         raise ValueError("No valid segments found in transcribe results.")
 
-    subtitles = []
-        
-    # Translation logic
+    # Collect the English text and character limit of every segment to translate
+    entries = []
     for item in segments_to_translate:
         start_time = float(item.get('start_time', 0))
         end_time = float(item.get('end_time', 0))
@@ -103,112 +240,78 @@ def lambda_handler(event, context):
         else:
             print(f"Skipping item due to missing text content: {item}")
             continue # Skip this item if no text can be found
-        
-
-        # Construct the prompt for Bedrock for natural translation
-        prompt = f"""
-        You are a professional translator converting English speech into Japanese subtitles for TTS (text-to-speech) narration.
-        Translate the English text into polite, clear, and natural Japanese using the "です・ます" form, suitable for subtitle narration. The style must be concise yet formal and sound natural to native Japanese speakers.
-
-        ⚠️ Your translation must fit within **{max_translated_characters} Japanese characters**. This is a strict limit. Do not exceed it.
-        ⚠️ However, DO NOT cut off the translation unnaturally. If your generated sentence becomes too long, **rephrase it naturally to reduce length** while maintaining meaning and politeness. Ensure that the result is a grammatically complete and natural Japanese sentence.
-
-        Omit filler words like "um", "uh", "you know", and similar expressions. If the input consists only of such words, return an empty string without any explanation.
-        If the English text consists only of such filler words, return an empty string with absolutely no explanation, placeholder, or substitute text. Just return nothing.
-
-        
-        When translating:
-        - Use proper particles (助詞) to ensure grammatical clarity and natural flow. Do not omit necessary particles like 「が」「を」「に」「と」.
-        - You MAY lightly adjust the sentence structure to improve fluency, only if the meaning is preserved.
-        - You MAY add auxiliary words or omit minor details to keep the output natural and concise.
-        - If the English text contains the word "Cognizant", do not translate it. Keep "Cognizant" as-is, since it is a proper noun referring to a company name.
 
-        Return only the final translated Japanese text. Do not include line breaks, formatting, or any commentary.
-
-        English text:
-        {english_text}
-        """
-
-        # print(f"[DEBUG] prompt length: {len(prompt)}")
-        # print(f"[DEBUG] prompt preview: {prompt[:500]}...")  
+        entries.append({
+            'id': len(entries),
+            'start_time': start_time,
+            'end_time': end_time,
+            'max_chars': max_translated_characters,
+            'text': english_text
+        })
 
-        # Improvement 2: Adjust maxTokenCount for Bedrock model.
-        bedrock_max_tokens = 2500 # Increased from 1000 to better accommodate 3000 characters.
+    # Improvement 2: Adjust maxTokenCount for Bedrock model.
+    bedrock_max_tokens = 2500 # Increased from 1000 to better accommodate 3000 characters.
+    # A batch reply carries several translations plus JSON framing, so it gets the model's full output budget.
+    bedrock_batch_max_tokens = 4096
 
-        # Invoke Bedrock Claude
+    # Translation logic for a single segment, used when a batch reply cannot be used
+    def translate_segment(entry):
+        english_text = entry['text']
         try:
-            body = json.dumps({
-                "anthropic_version": "bedrock-2023-05-31",
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": prompt.strip()
-                    }
-                ],
-                "max_tokens": bedrock_max_tokens,
-                "temperature": 0
-            })
-            print("[DEBUG] Request body for invoke_model:")
-            print(body)
-
-            response = bedrock_runtime.invoke_model(
-                body=body,
-                modelId="anthropic.claude-3-sonnet-20240229-v1:0",
-                accept="application/json",
-                contentType="application/json"
-            )
-            print("[DEBUG] Raw response:")
-            print(response)
-
-
-            response_body = json.loads(response.get('body').read().decode('utf-8'))
-            print("[DEBUG] Parsed response body:")
-            print(json.dumps(response_body, indent=2))
-
-            if "error" in response_body:
-                raise RuntimeError(f"Claude returned error: {response_body['error'].get('message', 'No message')}")
-
-            # Claude 3 expected structure
-            content_blocks = response_body.get('content', [])
-            if not content_blocks or 'text' not in content_blocks[0]:
-                raise ValueError(f"Unexpected response structure: {json.dumps(response_body, indent=2)}")
-
-            translated_text = content_blocks[0]['text'].strip()
+            translated_text = invoke_claude(bedrock_runtime, build_translation_prompt(english_text, entry['max_chars']), bedrock_max_tokens)
 
             if translated_text == "":
                 translated_text = "　"
 
-        except Exception as e:
-            import traceback
+        except Exception:
             print(f"[ERROR] Exception during translation of: {repr(english_text)}")
-            print(f"[ERROR] Bedrock request body: {body}")
             traceback.print_exc()
             translated_text = f"[TRANSLATION_ERROR] {english_text}"
 
-            if english_text.strip().lower() in ["um", "uh", "so", "well", "you know", "i mean", "uh,", "um,", "so,", "well,", "you know,", "i mean,"]:
-                translated_text = "　"
-            else:
-                translated_text = f"[TRANSLATION_ERROR] {english_text}"
+        return translated_text
 
-        subtitles.append({
-            'start_time': start_time,
-            'end_time': end_time,
-            'text': english_text,
-            'ja_text': translated_text or ""
-        })
+    # Translate a batch of segments in one prompt; returns {id: ja_text} for every entry in the batch
+    def translate_batch(batch):
+        translations = {}
+        try:
+            reply = invoke_claude(bedrock_runtime, build_batch_translation_prompt(batch), bedrock_batch_max_tokens)
+            # Tolerate stray text or code fences around the JSON array
+            parsed = json.loads(reply[reply.index('['):reply.rindex(']') + 1])
+            translations = {int(t['id']): str(t['ja']).strip() for t in parsed}
+        except Exception:
+            print(f"[WARN] Batch translation failed for ids {[entry['id'] for entry in batch]}; falling back to per-segment translation")
+            traceback.print_exc()
+
+        # Segments missing from the batch reply are translated individually
+        return {
+            entry['id']: (translations[entry['id']] or "　") if entry['id'] in translations else translate_segment(entry)
+            for entry in batch
+        }
+
+    # Filler-only segments are answered locally with a blank subtitle
+    translations = {entry['id']: "　" for entry in entries if FILLER_RE.match(entry['text'])}
+    entries_to_translate = [entry for entry in entries if entry['id'] not in translations]
+
+    # Translate batches concurrently; results are keyed by segment id so subtitle order is preserved
+    batches = [entries_to_translate[i:i + TRANSLATION_BATCH_SIZE] for i in range(0, len(entries_to_translate), TRANSLATION_BATCH_SIZE)]
+    with ThreadPoolExecutor(max_workers=MAX_TRANSLATION_WORKERS) as executor:
+        futures = [executor.submit(translate_batch, batch) for batch in batches]
+        for future in as_completed(futures):
+            translations.update(future.result())
+
+    subtitles = [
+        {
+            'start_time': entry['start_time'],
+            'end_time': entry['end_time'],
+            'text': entry['text'],
+            'ja_text': translations[entry['id']] or ""
+        }
+        for entry in entries
+    ]
 
     # Save translated subtitles to S3
     translated_subtitle_key = f"TranslateSubtitles/{os.path.basename(transcribe_result_key).replace('.json', '_ja.json')}"
-    local_translated_subtitle_file = '/tmp/translated_subtitle.json'
-    
-    with open(local_translated_subtitle_file, 'w', encoding='utf-8') as f:
-        json.dump(subtitles, f, ensure_ascii=False, indent=2)
-        
-    upload_file_to_s3(output_bucket, translated_subtitle_key, local_translated_subtitle_file, content_type='application/json')
-
-    # Clean up temporary files
-    os.remove(local_transcript_file)
-    os.remove(local_translated_subtitle_file)
+    upload_json_to_s3(output_bucket, translated_subtitle_key, subtitles)
 
     return {
         'input_video_key': input_video_key,
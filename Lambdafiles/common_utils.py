@@ -1,17 +1,62 @@
 # common_utils.py
 # This file contains common utility functions for interacting with S3
-# It provides functions to download and upload files to S3
+# It provides functions to download and upload files to S3,
+# stream data of unknown length to S3 with a multipart upload,
+# read and write small JSON documents directly in memory,
 # and get the bucket names from environment variables or directly defined
 
 import boto3
+import json
 import os
+from functools import lru_cache
+from types import MappingProxyType
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 
-s3 = boto3.client('s3')
+# orjson parses and serializes large transcripts several times faster than the stdlib json module.
+# It is installed in the container image; fall back to json where it is not available.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Concurrency of multipart transfers, scaled with the Lambda memory setting, since 1,769 MB buys one full vCPU.
+# The S3 client's connection pool is sized to match, so no transfer thread waits for or discards a connection.
+lambda_memory_mb = int(os.environ.get('AWS_LAMBDA_FUNCTION_MEMORY_SIZE', '1769'))
+s3_max_concurrency = min(16, max(4, 4 * (lambda_memory_mb // 1769)))
+
+# The S3 client is created on first use, so Lambdas that import this module
+# only for get_bucket_names never load the S3 service model during cold start.
+# Connection attempts give up after 5 seconds instead of botocore's default 60, and are retried.
+_s3 = None
+
+def get_s3_client():
+    # Get the shared S3 client, creating it once per container
+    global _s3
+    if _s3 is None:
+        _s3 = boto3.client('s3', config=Config(connect_timeout=5, max_pool_connections=s3_max_concurrency, tcp_keepalive=True))
+    return _s3
+
+class WarmupAttemptComplete(Exception):
+    pass
+
+def stop_after_first_attempt(**kwargs):
+    # needs-retry handler for init-time connection warm-ups.
+    # Raising from needs-retry ends the call after its first attempt, whatever the outcome
+    raise WarmupAttemptComplete()
+
+# Multipart, multi-threaded transfers for large video/audio files
+transfer_config = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=s3_max_concurrency,
+    use_threads=True
+)
 
 def download_file_from_s3(bucket_name, key, local_path):
     # Download file from S3
     print(f"Downloading s3://{bucket_name}/{key} to {local_path}")
-    s3.download_file(bucket_name, key, local_path)
+    get_s3_client().download_file(bucket_name, key, local_path, Config=transfer_config)
     if not os.path.exists(local_path):
         raise Exception(f"File not found after download: {local_path}")
     print(f"Downloaded {local_path} (size: {os.path.getsize(local_path)} bytes)")
@@ -20,12 +65,61 @@ def upload_file_to_s3(bucket_name, key, local_path, content_type=None):
     # Upload file to S3
     print(f"Uploading {local_path} to s3://{bucket_name}/{key}")
     extra_args = {'ContentType': content_type} if content_type else {}
-    s3.upload_file(local_path, bucket_name, key, ExtraArgs=extra_args)
+    get_s3_client().upload_file(local_path, bucket_name, key, ExtraArgs=extra_args, Config=transfer_config)
+    print(f"Uploaded s3://{bucket_name}/{key}")
+
+def upload_stream_to_s3(bucket_name, key, stream, content_type=None, before_complete=None):
+    # Upload a readable binary stream to S3 as it is produced, one multipart part at a time.
+    # before_complete is called once the stream is exhausted; if it raises, the upload is aborted.
+    print(f"Streaming upload to s3://{bucket_name}/{key}")
+    s3 = get_s3_client()
+    extra_args = {'ContentType': content_type} if content_type else {}
+    upload_id = s3.create_multipart_upload(Bucket=bucket_name, Key=key, **extra_args)['UploadId']
+    try:
+        parts = []
+        while True:
+            chunk = stream.read(transfer_config.multipart_chunksize)
+            if not chunk:
+                break
+            part_number = len(parts) + 1
+            response = s3.upload_part(Bucket=bucket_name, Key=key, UploadId=upload_id, PartNumber=part_number, Body=chunk)
+            parts.append({'ETag': response['ETag'], 'PartNumber': part_number})
+        if before_complete:
+            before_complete()
+        if not parts:
+            raise Exception(f"No data received for s3://{bucket_name}/{key}")
+        s3.complete_multipart_upload(Bucket=bucket_name, Key=key, UploadId=upload_id, MultipartUpload={'Parts': parts})
+    except BaseException:
+        s3.abort_multipart_upload(Bucket=bucket_name, Key=key, UploadId=upload_id)
+        raise
+    print(f"Uploaded s3://{bucket_name}/{key} ({len(parts)} parts)")
+
+def download_json_from_s3(bucket_name, key):
+    # Read and parse a JSON object from S3 in memory, without staging it in /tmp
+    print(f"Reading s3://{bucket_name}/{key}")
+    body = get_s3_client().get_object(Bucket=bucket_name, Key=key)['Body'].read()
+    return orjson.loads(body) if orjson else json.loads(body)
+
+def upload_json_to_s3(bucket_name, key, data):
+    # Serialize data as JSON and write it to S3 in memory, without staging it in /tmp
+    print(f"Writing s3://{bucket_name}/{key}")
+    if orjson:
+        body = orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    else:
+        body = json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+    get_s3_client().put_object(
+        Bucket=bucket_name,
+        Key=key,
+        Body=body,
+        ContentType='application/json'
+    )
     print(f"Uploaded s3://{bucket_name}/{key}")
 
+@lru_cache(maxsize=1)
 def get_bucket_names():
-    # Get bucket names
-    return {
+    # Get bucket names, read from the environment once per container.
+    # The mapping is read-only because every caller shares the same cached instance.
+    return MappingProxyType({
         'input_bucket': os.environ.get('INPUT_S3_BUCKET', 'cognizant-video-input'),
         'output_bucket': os.environ.get('OUTPUT_S3_BUCKET', 'cognizant-video-output')
-    }
\ No newline at end of file
+    })
\ No newline at end of file